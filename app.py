@@ -2,13 +2,16 @@
 app.py - Streamlit UI for Research Paper Summarizer
 """
 
-from typing import Optional
-import io
+from typing import Optional, List
+import gc
+import hashlib
 import logging
-import time
+import os
+import shutil
+import tempfile
 import streamlit as st
 from utils.pdf_reader import extract_text_from_pdf
-from utils.summarizer import Summarizer, chunk_text
+from utils.summarizer import Summarizer, chunk_token_ids
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -23,6 +26,32 @@ def get_summarizer(model_name: str):
     return s
 
 
+@st.cache_data(show_spinner=False, max_entries=4, ttl=3600)
+def _cached_extract(file_digest: str, _uploaded_file) -> str:
+    """
+    Extract text once per uploaded file content; Streamlit reruns (widget changes) hit the cache.
+    The leading underscore keeps Streamlit from hashing the file object itself.
+    """
+    # spool the upload to disk so the PDF parsers read it from a path instead of copying the bytes
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tf:
+        _uploaded_file.seek(0)
+        shutil.copyfileobj(_uploaded_file, tf)
+        pdf_path = tf.name
+    try:
+        return extract_text_from_pdf(pdf_path)
+    finally:
+        os.unlink(pdf_path)
+
+
+@st.cache_data(show_spinner=False, max_entries=4, ttl=3600)
+def _cached_chunks(file_digest: str, model_name: str, chunk_size: int, overlap: int, _text: str) -> List[List[int]]:
+    """
+    Tokenize and chunk once per (file, tokenizer, chunk settings) instead of on every rerun.
+    """
+    tokenizer = get_summarizer(model_name).tokenizer
+    return chunk_token_ids(_text, tokenizer, chunk_size=chunk_size, overlap=overlap)
+
+
 def main() -> None:
     st.title("📄 Research Paper Summarizer (Local, CPU-only)")
 
@@ -38,17 +67,19 @@ def main() -> None:
 
     uploaded_file = st.file_uploader("Upload PDF", type=["pdf"])
     if uploaded_file:
-        raw_bytes = uploaded_file.read()
-        st.info(f"Uploaded: {uploaded_file.name} ({len(raw_bytes)} bytes)")
+        st.info(f"Uploaded: {uploaded_file.name} ({uploaded_file.size} bytes)")
+        file_digest = hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
 
         try:
             with st.spinner("Extracting text..."):
-                extracted_text = extract_text_from_pdf(io.BytesIO(raw_bytes))
+                extracted_text = _cached_extract(file_digest, uploaded_file)
+            show_preview = False
             if not extracted_text:
                 st.warning("No text extracted.")
             else:
                 st.success(f"Extracted text length: {len(extracted_text)}")
-                if st.checkbox("Show extracted text preview (first 5000 chars)"):
+                show_preview = st.checkbox("Show extracted text preview (first 5000 chars)")
+                if show_preview:
                     st.text_area("Preview", value=extracted_text[:5000], height=300)
         except Exception as e:
             st.error(f"Extraction failed: {e}")
@@ -56,28 +87,30 @@ def main() -> None:
 
         if run_button:
             summarizer = get_summarizer(model_name)
-            tokenizer = summarizer.tokenizer
 
             with st.spinner("Creating chunks..."):
-                chunks = chunk_text(extracted_text, tokenizer, chunk_size=chunk_size, overlap=overlap)
+                chunks = _cached_chunks(file_digest, model_name, chunk_size, overlap, extracted_text)
             st.info(f"{len(chunks)} chunks created.")
+            if not show_preview:
+                # st.cache_data hands out a fresh copy per rerun; drop ours now that it is chunked
+                del extracted_text
+                gc.collect()
 
-            all_chunk_summaries = []
             progress_text = st.empty()
             progress_bar = st.progress(0)
-            total = len(chunks)
+
+            def report_progress(done: int, total: int) -> None:
+                progress_text.text(f"Summarized {done} of {total} chunks...")
+                progress_bar.progress(done / total)
 
             try:
-                for i in range(0, total, batch_size):
-                    batch = chunks[i:i + batch_size]
-                    progress_text.text(f"Summarizing chunks {i+1}-{min(i+batch_size,total)} of {total}...")
-                    summaries = summarizer.summarize_chunks(batch, batch_size=1, max_length=chunk_summary_max_length)
-                    all_chunk_summaries.extend(summaries)
-                    progress_bar.progress(min(1.0, (i+len(batch))/total))
-                    time.sleep(0.05)
+                all_chunk_summaries = summarizer.summarize_chunks(
+                    chunks, batch_size=batch_size, max_length=chunk_summary_max_length, progress_callback=report_progress
+                )
             except Exception as e:
                 st.error(f"Chunk summarization failed: {e}")
                 return
+            del chunks
 
             st.success("Chunk summarization completed.")
             st.write("### Chunk summaries (preview)")
@@ -85,7 +118,7 @@ def main() -> None:
                 st.markdown(f"**Chunk {idx}**: {cs}")
 
             with st.spinner("Aggregating summaries..."):
-                final_summary = summarizer.aggregate_summaries(all_chunk_summaries, final_summary_max_length)
+                final_summary = summarizer.aggregate_summaries(all_chunk_summaries, final_summary_max_length, batch_size=batch_size)
             st.write("## Final Summary")
             st.write(final_summary)
             st.download_button("Download summary", final_summary, file_name=f"{uploaded_file.name}_summary.txt")
@@ -22,15 +22,42 @@ def test_extract_text_from_empty_bytes():
     assert isinstance(text, str)
 
 
-def test_layout_aware_fix_merges_short_lines():
-    raw = "This is a line\nshort\nanother\n\nNew paragraph line which is rather long and stays as is."
-    fixed = pdf_reader._layout_aware_fix(raw)
-    assert "This is a line short another" in fixed or "This is a line short" in fixed
+def test_layout_aware_extract_reads_columns_in_order():
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=600, height=800)
+    # right column block sits higher on the page than the second left block
+    page.insert_text((50, 100), "Left column first")
+    page.insert_text((350, 150), "Right column first")
+    page.insert_text((50, 400), "Left column second")
+    page.insert_text((350, 450), "Right column second")
+    (helper_text,) = pdf_reader._layout_aware_extract(doc)
+    pdf_bytes = doc.write()
+    doc.close()
+    for text in (helper_text, pdf_reader.extract_text_from_pdf(pdf_bytes, ocr_threshold_chars=10)):
+        order = [text.index(s) for s in ("Left column first", "Left column second", "Right column first", "Right column second")]
+        assert order == sorted(order)
 
 
+def test_layout_aware_extract_keeps_single_column_order():
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=600, height=800)
+    body = " ".join(f"body{i}" for i in range(60))
+    # right-aligned running header and an equation indented past the midline on a one-column page
+    page.insert_text((420, 40), "Preprint, under review")
+    page.insert_textbox(fitz.Rect(50, 100, 550, 300), "First paragraph " + body, fontsize=10)
+    page.insert_text((320, 340), "E = m c^2 (1)")
+    page.insert_textbox(fitz.Rect(50, 380, 550, 600), "Second paragraph " + body, fontsize=10)
+    (text,) = pdf_reader._layout_aware_extract(doc)
+    doc.close()
+    order = [text.index(s) for s in ("Preprint, under review", "First paragraph", "E = m c^2 (1)", "Second paragraph")]
+    assert order == sorted(order)
+
 def test_ocr_fallback_mocked(monkeypatch):
     # Mock pytesseract.image_to_string to return some text to simulate OCR
     mock_text = "This is OCRed text."
+    monkeypatch.setattr("utils.pdf_reader.tesserocr", None)
     monkeypatch.setattr("utils.pdf_reader.pytesseract.image_to_string", lambda img: mock_text)
     # Create a minimal valid single-page PDF using PyMuPDF in memory
     import fitz
@@ -41,3 +68,151 @@ def test_ocr_fallback_mocked(monkeypatch):
     # Force OCR by setting high threshold
     text = pdf_reader.extract_text_from_pdf(io.BytesIO(pdf_bytes), ocr_threshold_chars=1000)
     assert "OCRed" in text or "Hello" in text or isinstance(text, str)
+
+
+def test_extract_text_from_pdf_reads_two_columns_in_order():
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=600, height=800)
+    left = " ".join(f"left{i}" for i in range(120))
+    right = " ".join(f"right{i}" for i in range(120))
+    page.insert_textbox(fitz.Rect(40, 40, 290, 760), left, fontsize=10)
+    page.insert_textbox(fitz.Rect(310, 40, 560, 760), right, fontsize=10)
+    pdf_bytes = doc.write()
+    doc.close()
+    text = pdf_reader.extract_text_from_pdf(pdf_bytes, ocr_threshold_chars=10)
+    assert text.index("left119") < text.index("right0")
+    assert " ".join(text.split()) == left + " " + right
+
+
+def test_ocr_only_runs_on_pages_without_text(monkeypatch):
+    import fitz
+    doc = fitz.open()
+    doc.insert_page(0, text=["Plenty of native text on this page"] * 5)
+    doc.new_page()  # blank page -> needs OCR
+    pdf_bytes = doc.write()
+    doc.close()
+    ocr_calls = []
+
+    def fake_ocr(source, page_numbers, zoom=2, doc=None):
+        ocr_calls.append(list(page_numbers))
+        return {p: "Recovered by OCR " * 20 for p in page_numbers}
+
+    monkeypatch.setattr(pdf_reader, "_ocr_with_fitz", fake_ocr)
+    text = pdf_reader.extract_text_from_pdf(pdf_bytes, ocr_threshold_chars=300)
+    assert ocr_calls == [[1]]
+    assert "Plenty of native text" in text and "Recovered by OCR" in text
+
+
+def test_ocr_with_fitz_keeps_page_order(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setattr("utils.pdf_reader.tesserocr", None)
+    monkeypatch.setattr("utils.pdf_reader.pytesseract.image_to_string", lambda img: f"{img.width}px")
+    # force the pool branch even on 1-CPU runners, and run workers in-process so the mock
+    # applies regardless of the multiprocessing start method (fork/spawn)
+    monkeypatch.setattr("utils.pdf_reader.os.cpu_count", lambda: 4)
+    monkeypatch.setattr("utils.pdf_reader.ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr("utils.pdf_reader._worker_source", None)
+    monkeypatch.setattr("utils.pdf_reader._worker_tess_api", None)
+    import fitz
+    doc = fitz.open()
+    for width in (100, 200, 300):
+        doc.new_page(width=width, height=100)
+    pdf_bytes = doc.write()
+    doc.close()
+    ocr_pages = pdf_reader._ocr_with_fitz(pdf_bytes, [2, 0, 1], zoom=1)
+    assert ocr_pages == {0: "100px", 1: "200px", 2: "300px"}
+    assert list(ocr_pages) == [0, 1, 2]
+    # the PDF was handed to the workers through the pool initializer
+    assert pdf_reader._worker_source == pdf_bytes
+
+
+def test_ocr_with_fitz_inline_reuses_open_doc(monkeypatch):
+    monkeypatch.setattr("utils.pdf_reader.tesserocr", None)
+    monkeypatch.setattr("utils.pdf_reader.pytesseract.image_to_string", lambda img: f"{img.width}px")
+    monkeypatch.setattr("utils.pdf_reader.os.cpu_count", lambda: 1)
+
+    def no_reopen(source):
+        raise AssertionError("inline OCR must render from the caller's open document")
+
+    monkeypatch.setattr(pdf_reader, "_open_fitz", no_reopen)
+    import fitz
+    doc = fitz.open()
+    doc.new_page(width=100, height=100)
+    doc.new_page(width=200, height=100)
+    assert pdf_reader._ocr_with_fitz(b"unused", [1, 0], zoom=1, doc=doc) == {0: "100px", 1: "200px"}
+    doc.close()
+
+def test_ocr_zoom_follows_scan_resolution():
+    import fitz
+    doc = fitz.open()
+    page = doc.new_page(width=72 * 8, height=72 * 8)  # 8in x 8in
+    assert pdf_reader._ocr_zoom(page, default_zoom=2) == 2
+    # 800px across 8in -> 100 DPI scan, rendered at native resolution instead of 144 DPI
+    page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 800, 800), False))
+    # a small 1200 DPI logo must not drive the render resolution of the whole scan
+    page.insert_image(fitz.Rect(0, 0, 36, 36), pixmap=fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 600, 600), False))
+    assert pdf_reader._ocr_zoom(page, default_zoom=2) == pytest.approx(100 / 72)
+    # 2400px across 8in -> 300 DPI scan, capped at the default zoom (144 DPI)
+    page = doc.new_page(width=72 * 8, height=72 * 8)
+    page.insert_image(page.rect, pixmap=fitz.Pixmap(fitz.csGRAY, fitz.IRect(0, 0, 2400, 2400), False))
+    assert pdf_reader._ocr_zoom(page, default_zoom=2) == 2
+    doc.close()
+
+
+def test_extract_text_from_path(tmp_path):
+    import fitz
+    doc = fitz.open()
+    doc.insert_page(0, text=["A page with a real text layer"] * 10)
+    pdf_path = tmp_path / "paper.pdf"
+    doc.save(str(pdf_path))
+    doc.close()
+    text = pdf_reader.extract_text_from_pdf(str(pdf_path), ocr_threshold_chars=10)
+    assert "A page with a real text layer" in text
+
+
+def test_ocr_pixmap_hands_pixels_to_pytesseract(monkeypatch):
+    import fitz
+    monkeypatch.setattr("utils.pdf_reader.tesserocr", None)
+    seen = {}
+    monkeypatch.setattr("utils.pdf_reader.pytesseract.image_to_string", lambda img: seen.setdefault("img", img.copy()) and "ok")
+    doc = fitz.open()
+    doc.insert_page(0, text="Hello world")
+    pix = doc[0].get_pixmap(colorspace=fitz.csGRAY, alpha=False)
+    assert pdf_reader._ocr_pixmap(pix) == "ok"
+    assert seen["img"].mode == "L" and seen["img"].size == (pix.width, pix.height)
+    assert seen["img"].tobytes() == pix.samples
+    doc.close()
+
+
+def test_ocr_pixmap_uses_a_fresh_tesserocr_handle_without_a_worker_handle(monkeypatch):
+    created = []
+
+    class FakeAPI:
+        def __init__(self):
+            created.append(self)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def SetImageBytes(self, *args):
+            pass
+
+        def GetUTF8Text(self):
+            return f"api{created.index(self)}"
+
+    monkeypatch.setattr("utils.pdf_reader.tesserocr", type("tesserocr", (), {"PyTessBaseAPI": FakeAPI}))
+    import fitz
+    doc = fitz.open()
+    doc.new_page()
+    pix = doc[0].get_pixmap(colorspace=fitz.csGRAY, alpha=False)
+    # inline (app process) calls each get their own handle, never a shared module-level one
+    assert [pdf_reader._ocr_pixmap(pix), pdf_reader._ocr_pixmap(pix)] == ["api0", "api1"]
+    # a worker-owned handle is reused as given
+    worker_api = FakeAPI()
+    assert pdf_reader._ocr_pixmap(pix, worker_api) == "api2"
+    assert len(created) == 3
+    doc.close()
@@ -4,6 +4,7 @@ Unit tests for utils/summarizer.py
 These tests use a dummy tokenizer and monkeypatching to avoid downloading models in CI.
 """
 
+import os
 import pytest
 from typing import List
 
@@ -13,6 +14,8 @@ from utils import summarizer
 class DummyTokenizer:
     """A very small dummy tokenizer for tests: splits on spaces and returns/accepts token ids as ints"""
 
+    model_max_length = 512
+
     def encode(self, text: str, add_special_tokens: bool = False):
         # map each word to an integer id (word length + index)
         words = text.split()
@@ -29,7 +32,7 @@ class DummySummarizer(summarizer.Summarizer):
         # override to avoid model downloads
         self.model_name = "dummy"
         self.tokenizer = DummyTokenizer()
-        self.summarizer_pipeline = lambda texts, **kwargs: [{"summary_text": (t[:100] if isinstance(t, str) else str(t))} for t in (texts if isinstance(texts, list) else [texts])]
+        self.pipeline = lambda texts, **kwargs: [{"summary_text": (t[:100] if isinstance(t, str) else str(t))} for t in (texts if isinstance(texts, list) else [texts])]
 
 
 def test_chunk_text_token_counts():
@@ -52,3 +55,132 @@ def test_summarizer_on_dummy(monkeypatch):
     final = s.aggregate_summaries(chunk_summaries, final_summary_max_length=100)
     assert isinstance(final, str)
     assert final  # non-empty
+
+
+def test_chunk_token_ids_windows_overlap():
+    dummy = DummyTokenizer()
+    text = " ".join("w" * (i % 7 + 1) for i in range(300))
+    windows = summarizer.chunk_token_ids(text, dummy, chunk_size=100, overlap=10)
+    ids = dummy.encode(text)
+    assert windows[0] == ids[:100]
+    assert windows[1][:10] == windows[0][-10:]
+    assert windows[-1][-1] == ids[-1]
+    assert len(windows) == len(summarizer.chunk_text(text, dummy, chunk_size=100, overlap=10))
+
+
+def test_aggregate_summaries_reduces_until_it_fits():
+    s = DummySummarizer()
+    s.load_model()
+    s.tokenizer.model_max_length = 100
+    final_inputs = []
+
+    def fake_pipeline(texts, **kwargs):
+        final_inputs.append(texts)
+        return [{"summary_text": "final"}]
+
+    s.pipeline = fake_pipeline
+    s._summarize_token_ids = lambda windows, *args: ["short summary"] * len(windows)
+    chunk_summaries = ["word " * 50] * 6  # 300 tokens, over the 68-token budget
+    final = s.aggregate_summaries(chunk_summaries, final_summary_max_length=20, final_summary_min_length=5)
+    assert final == "final"
+    assert len(s.tokenizer.encode(final_inputs[0])) <= 68
+
+
+def test_chunk_text_slices_original_text_with_fast_tokenizer():
+    from tokenizers import Tokenizer, models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {"[UNK]": 0, "alpha": 1, "beta": 2, "gamma": 3}
+    backend = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    backend.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    fast = PreTrainedTokenizerFast(tokenizer_object=backend, unk_token="[UNK]")
+    text = "alpha  beta\ngamma alpha beta  gamma"
+    chunks = summarizer.chunk_text(text, fast, chunk_size=4, overlap=1)
+    assert chunks == ["alpha  beta\ngamma alpha", "alpha beta  gamma"]
+
+
+def test_summarize_token_ids_reports_progress_per_batch():
+    s = DummySummarizer()
+    s.load_model()
+
+    class FakeTokenizer(DummyTokenizer):
+        def num_special_tokens_to_add(self):
+            return 0
+
+        def build_inputs_with_special_tokens(self, ids):
+            return ids
+
+        def pad(self, encoded, return_tensors=None):
+            import torch
+            from transformers import BatchEncoding
+            width = max(len(ids) for ids in encoded["input_ids"])
+            return BatchEncoding({"input_ids": torch.tensor([ids + [0] * (width - len(ids)) for ids in encoded["input_ids"]])})
+
+        def batch_decode(self, output_ids, skip_special_tokens=True):
+            return ["summary"] * len(output_ids)
+
+    class FakeModel:
+        device = "cpu"
+        config = type("Config", (), {"prefix": None})()
+
+        def generate(self, input_ids=None, **kwargs):
+            return input_ids
+
+    s.tokenizer = FakeTokenizer()
+    s.model = FakeModel()
+    calls = []
+    out = s.summarize_chunks([[1, 2], [3], [4, 5, 6], [7], [8]], batch_size=2, progress_callback=lambda done, total: calls.append((done, total)))
+    assert out == ["summary"] * 5
+    assert calls == [(2, 5), (4, 5), (5, 5)]
+
+
+class FakeORTModel:
+    """Stands in for optimum's ORTModelForSeq2SeqLM: records loads, writes a marker file on save."""
+
+    loads: List[tuple] = []
+
+    @classmethod
+    def from_pretrained(cls, name_or_path, **kwargs):
+        cls.loads.append((name_or_path, kwargs.get("export", False)))
+        return cls()
+
+    def save_pretrained(self, path):
+        with open(os.path.join(path, "model.onnx"), "w") as f:
+            f.write("onnx")
+
+
+class FakeSessionOptions:
+    intra_op_num_threads = 0
+
+
+def _patch_onnx(monkeypatch, tmp_path):
+    FakeORTModel.loads = []
+    monkeypatch.setattr(summarizer, "ORTModelForSeq2SeqLM", FakeORTModel)
+    monkeypatch.setattr(summarizer, "onnxruntime", type("ort", (), {"SessionOptions": FakeSessionOptions}))
+    monkeypatch.setattr(summarizer, "ONNX_CACHE_DIR", str(tmp_path))
+
+
+def test_load_onnx_model_exports_once_then_hits_cache(monkeypatch, tmp_path):
+    _patch_onnx(monkeypatch, tmp_path)
+    summarizer._load_onnx_model("org/model")
+    cache_path = tmp_path / "org--model"
+    assert FakeORTModel.loads == [("org/model", True)]
+    assert (cache_path / "model.onnx").exists()
+    assert os.listdir(tmp_path) == ["org--model"]  # no leftover temp export dirs
+
+    summarizer._load_onnx_model("org/model")
+    assert FakeORTModel.loads[-1] == (str(cache_path), False)
+
+
+def test_load_onnx_model_interrupted_export_leaves_no_cache(monkeypatch, tmp_path):
+    _patch_onnx(monkeypatch, tmp_path)
+
+    def failing_save(self, path):
+        with open(os.path.join(path, "partial.onnx"), "w") as f:
+            f.write("half")
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(FakeORTModel, "save_pretrained", failing_save)
+    with pytest.raises(KeyboardInterrupt):
+        summarizer._load_onnx_model("org/model")
+    assert os.listdir(tmp_path) == []
@@ -2,102 +2,217 @@
 utils/pdf_reader.py
 
 Robust PDF text extraction with deterministic fallback order:
-  1) pdfplumber structured extraction
-  2) basic layout-aware heuristic (reading by bbox left-to-right, top-to-bottom)
-  3) OCR fallback using PyMuPDF page render -> PIL image -> pytesseract
+  1) layout-aware PyMuPDF (fitz) extraction from text blocks, column by column, top-to-bottom
+     (MuPDF C backend, fast path)
+  2) OCR fallback using PyMuPDF page render -> tesserocr (or PIL image -> pytesseract), pages OCRed in parallel processes
 
 Expose: extract_text_from_pdf(path_or_bytes) -> str
 """
 
-from typing import Union, Optional, List
+from typing import Any, Union, Optional, List, Dict, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import io
 import logging
+import os
 
-import pdfplumber
 import fitz  # PyMuPDF
 from PIL import Image
 import pytesseract
 
+try:
+    # optional: in-process Tesseract binding, avoids a pytesseract subprocess + temp PNG per page
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# OCR worker process state, set once per worker by the pool initializer (never in the app process):
+# the PDF path or bytes, and a tesserocr API handle reused across that worker's pages
+_worker_source: Optional[Union[str, bytes]] = None
+_worker_tess_api = None
+
 
-def _extract_with_pdfplumber(fp: Union[str, bytes, io.BytesIO]) -> str:
+def _pdf_source(fp: Union[str, bytes, io.BytesIO]) -> Union[str, bytes]:
     """
-    Extract text using pdfplumber. This tries to preserve reading order via pdfplumber's layout.
+    Normalize the input once: a path stays a path (PyMuPDF opens it from disk,
+    so the file is never held in memory twice); bytes and file-like objects are read into bytes.
     """
-    logger.info("Trying pdfplumber extraction")
-    text_parts: List[str] = []
-    # pdfplumber accepts file path or file-like object
-    with pdfplumber.open(fp) as pdf:
-        for i, page in enumerate(pdf.pages):
-            try:
-                # page.extract_text() attempts to return text in a readable order
-                txt = page.extract_text(x_tolerance=2, y_tolerance=3) or ""
-            except Exception as e:
-                logger.debug("pdfplumber page extract failed: %s", e)
-                txt = ""
-            if txt:
-                text_parts.append(txt)
-    combined = "\n\n".join(text_parts).strip()
-    logger.info("pdfplumber extracted %d characters", len(combined))
-    return combined
+    if isinstance(fp, (str, os.PathLike)):
+        return os.fspath(fp)
+    if isinstance(fp, (bytes, bytearray)):
+        return bytes(fp)
+    fp.seek(0)
+    return fp.read()
 
 
-def _ocr_with_fitz(fp: Union[str, bytes, io.BytesIO]) -> str:
+def _open_fitz(source: Union[str, bytes]) -> fitz.Document:
     """
-    Render pages with PyMuPDF (fitz) to images, run pytesseract on each, and concatenate.
-    This is used as a fallback for scanned PDFs or when structured extraction fails.
+    Open a PDF with PyMuPDF from a path or raw bytes (see _pdf_source).
+    """
+    if isinstance(source, str):
+        return fitz.open(source)
+    return fitz.open(stream=source, filetype="pdf")
+
+
+def _ocr_pixmap(pix: fitz.Pixmap, tess_api: Any = None) -> str:
+    """
+    Run Tesseract on a rendered page: tesserocr on the raw samples when available, else pytesseract.
+    tess_api is a worker-owned PyTessBaseAPI to reuse; without one a handle is created for this call
+    only, since a Tesseract handle must not be shared between threads (e.g. Streamlit sessions).
+    """
+    if tesserocr is not None:
+        if tess_api is None:
+            with tesserocr.PyTessBaseAPI() as api:
+                return _ocr_pixmap(pix, api)
+        tess_api.SetImageBytes(pix.samples, pix.width, pix.height, pix.n, pix.stride)
+        return tess_api.GetUTF8Text()
+    # frombuffer over samples_mv wraps the pixmap memory without copying it; pix must outlive img
+    mode = "L" if pix.n == 1 else "RGB"
+    img = Image.frombuffer(mode, (pix.width, pix.height), pix.samples_mv, "raw", mode, pix.stride, 1)
+    return pytesseract.image_to_string(img)
+
+
+def _ocr_zoom(page: fitz.Page, default_zoom: float = 2) -> float:
+    """
+    Pick the render zoom for OCR. Tesseract time grows ~linearly with pixel count, so a scanned page
+    is rendered at its native resolution when that is below default_zoom (no upsampling of pixels
+    that are not there), and never above default_zoom. The scan is the image covering the largest
+    share of the page, so small high-resolution logos or stamps do not decide the resolution.
+    Pages without images use default_zoom.
+    """
+    scan_area = 0.0
+    native_dpi = 0.0
+    for info in page.get_image_info():
+        x0, y0, x1, y1 = info["bbox"]
+        area = (x1 - x0) * (y1 - y0)
+        if x1 > x0 and area > scan_area:
+            scan_area = area
+            native_dpi = info["width"] / (x1 - x0) * 72
+    if not native_dpi:
+        return default_zoom
+    return min(default_zoom, native_dpi / 72)
+
+
+def _ocr_doc_page(doc: fitz.Document, page_no: int, zoom: float = 2, tess_api: Any = None) -> Tuple[int, str]:
+    """
+    OCR a single page of an open document: render it and run Tesseract on it.
+    Failures are logged and give an empty string so one bad page does not stop the others.
     """
-    logger.info("Starting OCR pass with PyMuPDF + pytesseract")
-    text_parts: List[str] = []
-    # fitz.open accepts bytes or path
-    doc = fitz.open(stream=fp, filetype="pdf") if isinstance(fp, (bytes, io.BytesIO)) else fitz.open(fp)
-    zoom = 2  # render resolution multiplier
-    mat = fitz.Matrix(zoom, zoom)
-    for page_no in range(len(doc)):
+    try:
         page = doc.load_page(page_no)
+        page_zoom = _ocr_zoom(page, default_zoom=zoom)
+        # single gray channel: Tesseract binarizes anyway, and it is 3x fewer bytes than RGB
+        pix = page.get_pixmap(matrix=fitz.Matrix(page_zoom, page_zoom), colorspace=fitz.csGRAY, alpha=False)
+        ocr_text = _ocr_pixmap(pix, tess_api)
+        logger.debug("OCR page %d produced %d chars", page_no, len(ocr_text))
+        return page_no, ocr_text
+    except Exception as e:
+        logger.exception("OCR rendering/recognition failed on page %d: %s", page_no, e)
+        return page_no, ""
+
+
+def _ocr_page(source: Union[str, bytes], page_no: int, zoom: float = 2, tess_api: Any = None) -> Tuple[int, str]:
+    """
+    OCR a single page. Top-level so it can run in a worker process: each call opens its own
+    fitz.Document from the path or raw bytes (see _ocr_doc_page).
+    """
+    try:
+        with _open_fitz(source) as doc:
+            return _ocr_doc_page(doc, page_no, zoom, tess_api)
+    except Exception as e:
+        logger.exception("OCR could not open the PDF for page %d: %s", page_no, e)
+        return page_no, ""
+
+
+def _init_ocr_worker(source: Union[str, bytes]) -> None:
+    global _worker_source, _worker_tess_api
+    _worker_source = source
+    if tesserocr is not None:
+        _worker_tess_api = tesserocr.PyTessBaseAPI()
+
+
+def _ocr_worker_page(page_no: int, zoom: float = 2) -> Tuple[int, str]:
+    return _ocr_page(_worker_source, page_no, zoom, _worker_tess_api)
+
+
+def _ocr_with_fitz(
+    source: Union[str, bytes], page_numbers: List[int], zoom: float = 2, doc: Optional[fitz.Document] = None
+) -> Dict[int, str]:
+    """
+    Render pages with PyMuPDF (fitz) to images and run Tesseract on each, one worker process per core.
+    This is used as a fallback for scanned PDFs or when structured extraction fails.
+
+    Args:
+        source: PDF path or raw bytes (workers reopen the document themselves).
+        page_numbers: pages to OCR.
+        zoom: render resolution multiplier for pages without embedded images (scans use their native DPI).
+        doc: the caller's already-open document, rendered from directly when OCR runs in-process.
+
+    Returns:
+        Mapping of page number -> OCR text.
+    """
+    logger.info("Starting OCR pass with PyMuPDF + %s on %d page(s)", "tesserocr" if tesserocr else "pytesseract", len(page_numbers))
+    max_workers = min(os.cpu_count() or 1, len(page_numbers))
+    if max_workers <= 1:
+        # not worth spawning processes for a single page; reuse the open document when there is one
+        if doc is not None:
+            results = [_ocr_doc_page(doc, page_no, zoom) for page_no in page_numbers]
+        else:
+            results = [_ocr_page(source, page_no, zoom) for page_no in page_numbers]
+    else:
+        # the PDF goes to each worker once via the initializer, not pickled into every page task
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_ocr_worker, initargs=(source,)) as executor:
+            results = list(executor.map(partial(_ocr_worker_page, zoom=zoom), page_numbers))
+    ocr_pages = {page_no: text for page_no, text in sorted(results) if text}
+    logger.info("OCR extracted %d characters", sum(len(t) for t in ocr_pages.values()))
+    return ocr_pages
+
+
+def _is_two_column(blocks: List[tuple], mid_x: float) -> bool:
+    """
+    Decide whether a page is laid out in two columns: there is text on both sides of the midline,
+    and each side holds more text than the blocks crossing it (full-width titles, abstracts).
+    On a single-column page the body paragraphs cross the midline, so a right-aligned header or
+    an indented equation alone does not make the page two-column.
+    """
+    left = right = crossing = 0
+    for x0, _, x1, _, text, *_ in blocks:
+        if x1 <= mid_x:
+            left += len(text)
+        elif x0 >= mid_x:
+            right += len(text)
+        else:
+            crossing += len(text)
+    return min(left, right) > crossing
+
+
+def _layout_aware_extract(doc: fitz.Document) -> List[str]:
+    """
+    Rebuild each page's text from PyMuPDF text blocks in reading order. On two-column pages blocks
+    are grouped into left/right column halves, then read top-to-bottom, so columns are not
+    interleaved; other pages keep PyMuPDF's top-to-bottom block order.
+    Lines inside a block are joined into one paragraph. Returns one string per page.
+    """
+    logger.info("Trying layout-aware PyMuPDF extraction")
+    page_texts: List[str] = []
+    for page_no in range(doc.page_count):
         try:
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            ocr_text = pytesseract.image_to_string(img)
-            text_parts.append(ocr_text)
-            logger.debug("OCR page %d produced %d chars", page_no, len(ocr_text))
+            page = doc.load_page(page_no)
+            half_width = page.rect.width / 2 or 1
+            # block tuples: (x0, y0, x1, y1, text, block_no, block_type); type 0 is text, 1 is image
+            blocks = [b for b in page.get_text("blocks", sort=True) if b[6] == 0]
+            if _is_two_column(blocks, half_width):
+                blocks.sort(key=lambda b: (b[0] // half_width, b[1], b[0]))
+            paragraphs = (" ".join(b[4].split()) for b in blocks)
+            page_texts.append("\n\n".join(p for p in paragraphs if p))
         except Exception as e:
-            logger.exception("OCR rendering/recognition failed on page %d: %s", page_no, e)
-    doc.close()
-    combined = "\n\n".join(text_parts).strip()
-    logger.info("OCR extracted %d characters", len(combined))
-    return combined
-
-
-def _layout_aware_fix(raw_text: str) -> str:
-    """
-    A very simple attempt to reorganize text when extraction returns columns mixed
-    or many short lines: join short lines into paragraphs and keep order.
-    This is heuristic and intentionally conservative.
-    """
-    logger.info("Applying layout-aware cleanup")
-    lines = raw_text.splitlines()
-    cleaned_lines: List[str] = []
-    buffer = []
-    for line in lines:
-        if not line.strip():
-            if buffer:
-                cleaned_lines.append(" ".join(buffer))
-                buffer = []
-            continue
-        # if line is short, likely part of paragraph; if very long, treat as paragraph by itself
-        if len(line) < 120:
-            buffer.append(line.strip())
-        else:
-            if buffer:
-                cleaned_lines.append(" ".join(buffer))
-                buffer = []
-            cleaned_lines.append(line.strip())
-    if buffer:
-        cleaned_lines.append(" ".join(buffer))
-    return "\n\n".join(cleaned_lines).strip()
+            logger.debug("fitz block extract failed on page %d: %s", page_no, e)
+            page_texts.append("")
+    logger.info("PyMuPDF extracted %d characters", sum(len(t) for t in page_texts))
+    return page_texts
 
 
 def extract_text_from_pdf(path_or_bytes: Union[str, bytes, io.BytesIO], ocr_threshold_chars: int = 200) -> str:
@@ -111,33 +226,52 @@ def extract_text_from_pdf(path_or_bytes: Union[str, bytes, io.BytesIO], ocr_thre
     Returns:
         A single string containing extracted text.
     """
-    # Try pdfplumber first
+    source = _pdf_source(path_or_bytes)
+
+    # Open the document once and share it between the text-layer and OCR passes
     try:
-        text = _extract_with_pdfplumber(path_or_bytes)
+        doc: Optional[fitz.Document] = _open_fitz(source)
     except Exception as e:
-        logger.exception("pdfplumber extraction failed: %s", e)
-        text = ""
+        logger.exception("PyMuPDF could not open the document: %s", e)
+        doc = None
 
-    # If extraction produced little text -> try layout-aware fix
-    if text and len(text) < (ocr_threshold_chars * 2):
-        logger.info("Extraction produced small text (%d chars). Applying layout-aware heuristics.", len(text))
-        text_fixed = _layout_aware_fix(text)
-        if len(text_fixed) > len(text):
-            text = text_fixed
+    try:
+        page_texts: List[str] = []
+        text = ""
+        if doc is not None:
+            try:
+                page_texts = _layout_aware_extract(doc)
+                text = "\n\n".join(t for t in page_texts if t).strip()
+            except Exception as e:
+                logger.exception("PyMuPDF extraction failed: %s", e)
 
-    # If still too little text -> OCR fallback
-    if not text or len(text) < ocr_threshold_chars:
-        logger.info("Falling back to OCR because extracted text length is %d", len(text))
-        try:
-            ocr_text = _ocr_with_fitz(path_or_bytes)
-            if ocr_text and len(ocr_text) > len(text):
-                logger.info("OCR produced more text (%d chars) than previous extraction (%d). Using OCR output.", len(ocr_text), len(text))
-                text = ocr_text
-        except pytesseract.TesseractError as t_err:
-            logger.exception("Tesseract not found or failed: %s", t_err)
-            raise RuntimeError("Tesseract not found or failing. Please install Tesseract OCR and ensure it's on PATH.") from t_err
-        except Exception as e:
-            logger.exception("OCR fallback failed: %s", e)
+        # If too little text -> OCR fallback, only for pages without a usable text layer
+        if doc is not None and doc.page_count and (not text or len(text) < ocr_threshold_chars):
+            logger.info("Falling back to OCR because extracted text length is %d", len(text))
+            if len(page_texts) != doc.page_count:
+                page_texts = [""] * doc.page_count
+            per_page_threshold = ocr_threshold_chars / doc.page_count
+            ocr_targets = [i for i, t in enumerate(page_texts) if len(t.strip()) < per_page_threshold]
+            try:
+                ocr_pages = _ocr_with_fitz(source, ocr_targets, doc=doc)
+                merged_parts: List[str] = []
+                for page_no, page_text in enumerate(page_texts):
+                    ocr_text = ocr_pages.get(page_no, "")
+                    best = ocr_text if len(ocr_text.strip()) > len(page_text.strip()) else page_text
+                    if best.strip():
+                        merged_parts.append(best)
+                ocr_text = "\n\n".join(merged_parts).strip()
+                if ocr_text and len(ocr_text) > len(text):
+                    logger.info("OCR produced more text (%d chars) than previous extraction (%d). Using OCR output.", len(ocr_text), len(text))
+                    text = ocr_text
+            except pytesseract.TesseractError as t_err:
+                logger.exception("Tesseract not found or failed: %s", t_err)
+                raise RuntimeError("Tesseract not found or failing. Please install Tesseract OCR and ensure it's on PATH.") from t_err
+            except Exception as e:
+                logger.exception("OCR fallback failed: %s", e)
+    finally:
+        if doc is not None:
+            doc.close()
 
     final = text.strip()
     logger.info("Final extracted text length: %d", len(final))
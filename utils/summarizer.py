@@ -4,45 +4,134 @@ utils/summarizer.py
 Hierarchical summarization and simple wrapper for HuggingFace transformers.
 Provides:
 - Summarizer class for chunked summarization
-- chunk_text() function
+- chunk_token_ids() / chunk_text() functions
 - optional summarize_text() simple function
 """
 
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Callable, Sequence, Tuple, Union
 import logging
+import os
+import shutil
+import tempfile
 import torch
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
 
+try:
+    # optional: ONNX Runtime backend for faster CPU inference
+    import onnxruntime
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+except ImportError:
+    onnxruntime = None
+    ORTModelForSeq2SeqLM = None
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+# exported ONNX models are cached here, one directory per model name
+ONNX_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "research-paper-summarizer", "onnx")
 
-def chunk_text(text: str, tokenizer: Any, chunk_size: int = 512, overlap: int = 64) -> List[str]:
-    """
-    Chunk text into sliding windows of tokens using tokenizer.
-    """
+
+def _check_chunk_params(chunk_size: int, overlap: int) -> None:
     if chunk_size <= 0 or overlap >= chunk_size or overlap < 0:
         raise ValueError("Invalid chunk_size or overlap")
 
-    enc = tokenizer.encode(text, add_special_tokens=False)
-    total_tokens = len(enc)
-    if total_tokens == 0:
-        return []
 
-    chunks = []
+def _window_bounds(total_tokens: int, chunk_size: int, overlap: int) -> List[Tuple[int, int]]:
+    """
+    (start, end) token positions of sliding windows of chunk_size tokens overlapping by overlap.
+    """
+    bounds = []
     start = 0
     step = chunk_size - overlap
     while start < total_tokens:
         end = min(start + chunk_size, total_tokens)
-        token_ids = enc[start:end]
-        decoded = tokenizer.decode(token_ids, clean_up_tokenization_spaces=True, skip_special_tokens=True)
-        chunks.append(decoded.strip())
+        bounds.append((start, end))
         if end == total_tokens:
             break
         start += step
+    return bounds
+
+
+def chunk_token_ids(text: str, tokenizer: Any, chunk_size: int = 512, overlap: int = 64) -> List[List[int]]:
+    """
+    Chunk text into sliding windows of token ids (no special tokens), without decoding them back to text.
+    """
+    _check_chunk_params(chunk_size, overlap)
+    enc = tokenizer.encode(text, add_special_tokens=False)
+    return [enc[start:end] for start, end in _window_bounds(len(enc), chunk_size, overlap)]
+
+
+def chunk_text(text: str, tokenizer: Any, chunk_size: int = 512, overlap: int = 64) -> List[str]:
+    """
+    Chunk text into sliding windows of tokens using tokenizer.
+    With a fast (Rust) tokenizer the chunks are sliced straight out of the original text via the
+    offset mapping, so no decode is needed and the original formatting is kept.
+    """
+    _check_chunk_params(chunk_size, overlap)
+    if getattr(tokenizer, "is_fast", False):
+        offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+        return [
+            text[offsets[start][0]:offsets[end - 1][1]].strip()
+            for start, end in _window_bounds(len(offsets), chunk_size, overlap)
+        ]
+
+    chunks = []
+    for token_ids in chunk_token_ids(text, tokenizer, chunk_size=chunk_size, overlap=overlap):
+        decoded = tokenizer.decode(token_ids, clean_up_tokenization_spaces=True, skip_special_tokens=True)
+        chunks.append(decoded.strip())
     return chunks
 
 
+def _configure_cpu_threads() -> None:
+    """
+    Use every core for intra-op parallelism (GEMM kernels) and a single inter-op thread.
+    """
+    torch.set_num_threads(os.cpu_count() or 1)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # can only be set once, before any inter-op parallel work has started
+        logger.debug("Inter-op thread count already fixed; leaving it unchanged")
+
+
+def _load_onnx_model(model_name: str) -> Any:
+    """
+    Load an ONNX Runtime seq2seq model, exporting it from the PyTorch checkpoint on first use only.
+    The export is written to a temporary directory and moved into the cache in one os.replace, so an
+    interrupted export never leaves a half-written cache entry behind.
+    """
+    session_options = onnxruntime.SessionOptions()
+    session_options.intra_op_num_threads = os.cpu_count() or 1
+    cache_path = os.path.join(ONNX_CACHE_DIR, model_name.replace("/", "--"))
+    if os.path.isdir(cache_path):
+        return ORTModelForSeq2SeqLM.from_pretrained(cache_path, provider="CPUExecutionProvider", session_options=session_options)
+    logger.info("Exporting %s to ONNX (one-time cost, cached in %s)", model_name, cache_path)
+    ort_model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, provider="CPUExecutionProvider", session_options=session_options)
+    os.makedirs(ONNX_CACHE_DIR, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".export-", dir=ONNX_CACHE_DIR)
+    try:
+        ort_model.save_pretrained(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # e.g. another process finished the same export first; keep its cache entry
+        logger.warning("Could not cache ONNX export of %s: %s", model_name, e)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return ort_model
+
+
+def _load_torch_model(model_name: str) -> Any:
+    """
+    Load the PyTorch seq2seq model with fused scaled_dot_product_attention where the architecture
+    supports it (e.g. BART); others (e.g. T5) fall back to their default attention.
+    """
+    try:
+        return AutoModelForSeq2SeqLM.from_pretrained(model_name, attn_implementation="sdpa")
+    except ValueError:
+        logger.info("%s does not support SDPA attention; using the default implementation", model_name)
+        return AutoModelForSeq2SeqLM.from_pretrained(model_name)
+
+
 class Summarizer:
     """
     Summarizer class: lazy loads model, summarization of chunks, final aggregation.
@@ -54,36 +143,100 @@ class Summarizer:
         self.model = None
         self.pipeline = None
 
-    def load_model(self, model_name: str = "t5-small", device: int = -1, use_fast_tokenizer: bool = True) -> None:
+    def load_model(self, model_name: str = "t5-small", device: int = -1, use_fast_tokenizer: bool = True, quantize: bool = True, use_onnx: bool = True, compile_model: bool = False) -> None:
         """
         Lazy load tokenizer, model, and pipeline.
+        On CPU (device=-1) the model runs on ONNX Runtime when optimum[onnxruntime] is installed and
+        use_onnx=True; otherwise PyTorch is used and, with quantize=True, Linear layers are
+        dynamically quantized to int8. compile_model=True additionally wraps the PyTorch model's
+        forward in torch.compile (needs PyTorch 2.x and a C++ toolchain; first calls are slow).
         """
         if self.model_name == model_name and self.pipeline is not None:
             return
         self.tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=use_fast_tokenizer)
-        self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+        if device == -1 and use_onnx and ORTModelForSeq2SeqLM is not None:
+            self.model = _load_onnx_model(model_name)
+        else:
+            if device == -1 and use_onnx:
+                logger.info("optimum[onnxruntime] not installed; using PyTorch on CPU")
+            self.model = _load_torch_model(model_name)
+            if device == -1:
+                _configure_cpu_threads()
+                if quantize:
+                    # int8 weights for nn.Linear via fbgemm; activations are quantized on the fly
+                    self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+            self.model.eval()
+            if compile_model:
+                # compile forward in place so generate() and the pipeline keep working with the original module
+                self.model.forward = torch.compile(self.model.forward, mode="reduce-overhead", dynamic=True)
         self.pipeline = pipeline("summarization", model=self.model, tokenizer=self.tokenizer, device=device)
         self.model_name = model_name
 
-    def summarize_chunks(self, chunks: List[str], batch_size: int = 4, max_length: int = 150, min_length: int = 30) -> List[str]:
+    def _max_input_length(self) -> int:
         """
-        Summarize list of chunks in batches.
+        Maximum number of input tokens the model accepts (including special tokens).
         """
-        if not self.pipeline:
-            raise RuntimeError("Model not loaded. Call load_model() first.")
+        max_len = self.tokenizer.model_max_length
+        if max_len > 100_000:
+            # tokenizer has no limit configured (sentinel value); fall back to the model config
+            max_len = getattr(self.model.config, "max_position_embeddings", None) or 512
+        return max_len
+
+    def _summarize_token_ids(self, chunks: Sequence[List[int]], batch_size: int, max_length: int, min_length: int, progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """
+        Summarize pre-tokenized chunks by calling model.generate directly, skipping the pipeline's re-encode.
+        progress_callback(done, total) is called after each batch.
+        """
+        # mirror the pipeline's preprocessing: task prefix (e.g. "summarize: " for T5) and its generation config
+        prefix = getattr(self.pipeline, "prefix", None) or getattr(self.model.config, "prefix", None) or ""
+        prefix_ids = self.tokenizer.encode(prefix, add_special_tokens=False) if prefix else []
+        generation_config = getattr(self.pipeline, "generation_config", None)
+        budget = self._max_input_length() - self.tokenizer.num_special_tokens_to_add()
 
-        summaries = []
+        summaries: List[str] = [""] * len(chunks)
         for i in range(0, len(chunks), batch_size):
-            batch = chunks[i:i + batch_size]
-            with torch.no_grad():
-                results = self.pipeline(batch, max_length=max_length, min_length=min_length, truncation=True)
-            for r in results:
-                summaries.append(r.get("summary_text", "").strip())
+            batch_ids = [
+                self.tokenizer.build_inputs_with_special_tokens((prefix_ids + list(ids))[:budget])
+                for ids in chunks[i:i + batch_size]
+            ]
+            inputs = self.tokenizer.pad({"input_ids": batch_ids}, return_tensors="pt").to(self.model.device)
+            with torch.inference_mode():
+                output_ids = self.model.generate(
+                    **inputs, generation_config=generation_config, max_length=max_length, min_length=min_length
+                )
+            summaries[i:i + len(batch_ids)] = [s.strip() for s in self.tokenizer.batch_decode(output_ids, skip_special_tokens=True)]
+            if progress_callback is not None:
+                progress_callback(i + len(batch_ids), len(chunks))
         return summaries
 
-    def aggregate_summaries(self, chunk_summaries: List[str], final_summary_max_length: int = 200, final_summary_min_length: int = 50) -> str:
+    def summarize_chunks(self, chunks: Sequence[Union[str, List[int]]], batch_size: int = 4, max_length: int = 150, min_length: int = 30, progress_callback: Optional[Callable[[int, int], None]] = None) -> List[str]:
+        """
+        Summarize list of chunks, `batch_size` at a time.
+        Chunks may be strings (run through the pipeline) or token-id lists from chunk_token_ids()
+        (fed straight to model.generate, avoiding a decode/re-encode round-trip).
+        progress_callback(done, total) is called after each batch of token-id chunks; for string
+        chunks the pipeline runs as one call, so it is called once at the end.
+        """
+        if not self.pipeline:
+            raise RuntimeError("Model not loaded. Call load_model() first.")
+
+        if not chunks:
+            return []
+        if not isinstance(chunks[0], str):
+            return self._summarize_token_ids(chunks, batch_size, max_length, min_length, progress_callback)
+        # The pipeline pads and batches internally; one call avoids per-batch dispatch overhead.
+        with torch.inference_mode():
+            results = self.pipeline(chunks, batch_size=batch_size, max_length=max_length, min_length=min_length, truncation=True)
+        if progress_callback is not None:
+            progress_callback(len(chunks), len(chunks))
+        # summarization pipelines always return "summary_text"
+        return [r["summary_text"].strip() for r in results]
+
+    def aggregate_summaries(self, chunk_summaries: List[str], final_summary_max_length: int = 200, final_summary_min_length: int = 50, batch_size: int = 4) -> str:
         """
         Aggregate chunk summaries into a final summary.
+        If the joined summaries do not fit in the model's input, they are summarized window by
+        window and re-joined (hierarchically) until they do, instead of being silently truncated.
         """
         if not chunk_summaries:
             return ""
@@ -94,9 +247,25 @@ class Summarizer:
         if len(concat.split()) <= final_summary_min_length:
             return concat.strip()
 
-        with torch.no_grad():
+        # leave room for special tokens and the task prefix
+        max_input = self._max_input_length()
+        budget = max(1, max_input - 32)
+        window = max(1, max_input - 64)
+        input_ids = self.tokenizer.encode(concat, add_special_tokens=False)
+        while len(input_ids) > budget:
+            logger.info("Summaries exceed model input (%d > %d tokens); summarizing another level", len(input_ids), budget)
+            windows = [input_ids[i:i + window] for i in range(0, len(input_ids), window)]
+            partials = self._summarize_token_ids(windows, batch_size, final_summary_max_length, final_summary_min_length)
+            reduced = "\n\n".join(partials)
+            reduced_ids = self.tokenizer.encode(reduced, add_special_tokens=False)
+            if len(reduced_ids) >= len(input_ids):
+                # summaries are not getting shorter; let the final pass truncate
+                break
+            concat, input_ids = reduced, reduced_ids
+
+        with torch.inference_mode():
             result = self.pipeline(concat, max_length=final_summary_max_length, min_length=final_summary_min_length, truncation=True)
-        return result[0].get("summary_text", "").strip()
+        return result[0]["summary_text"].strip()
 
 
 def summarize_text(text: str, max_words: int = 200) -> str: